@@ -2,12 +2,11 @@
 """
 
 import argparse
-from .settings import Settings, SubCommand
+import functools
 
-class Arguments:
-    """Parses the arguments for the restictool"""
+from .settings import Settings, SubCommand
 
-    _HELP_EPILOG = """
+_HELP_EPILOG = """
     Use %(prog)s {backup,restore,run} --help to get the subcommand
     specific help.
 
@@ -15,6 +14,137 @@ class Arguments:
     first arguments is a recognized optional one, use -- as a separator.
     """
 
+
+def _positive_int(value: str) -> int:
+    """Parse a positive integer argument"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+
+    return number
+
+
+def _non_negative_int(value: str) -> int:
+    """Parse a non-negative integer argument"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a non-negative integer")
+
+    return number
+
+
+@functools.cache
+def _build_parser(version: str) -> argparse.ArgumentParser:
+    """Build the argument parser. It is immutable, so it is only built once."""
+    parser = argparse.ArgumentParser(
+        prog="restictool",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="A Python wrapper for the dockerized restic tool (v" + version + ")",
+        epilog=_HELP_EPILOG,
+    )
+
+    parser.add_argument(
+        "-c",
+        "--config",
+        default=Settings.DEFAULT_CONFIGURATION_FILE,
+        metavar="FILE",
+        help="the configuration file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=Settings.DEFAULT_CACHE_DIR,
+        metavar="DIR",
+        help="the cache directory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--image",
+        default=Settings.DEFAULT_IMAGE,
+        help="the docker restic image name (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--force-pull",
+        action="store_true",
+        help="force pulling of the docker image first",
+    )
+    parser.add_argument(
+        "--pull-ttl",
+        type=_non_negative_int,
+        default=Settings.DEFAULT_PULL_TTL,
+        metavar="SECONDS",
+        help="skip a forced pull if the image was pulled less than SECONDS ago,"
+        " 0 to always pull (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        choices=["critical", "error", "warning", "info", "debug"],
+        default="warning",
+        help="set the logging level (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="silence output from the restic",
+    )
+
+    subparsers = parser.add_subparsers(
+        dest="subcommand",
+        required=True,
+        title="subcommands",
+        help="mode of the operation",
+    )
+
+    parser_backup = subparsers.add_parser(
+        "backup", help="backup the sources specified in the configuration file"
+    )
+    parser_backup.add_argument(
+        "--parallel",
+        type=_positive_int,
+        default=1,
+        metavar="N",
+        help="back up at most N sources at the same time (default: %(default)s)",
+    )
+
+    parser_restore = subparsers.add_parser(
+        "restore", help="restore a snapshot into the specified directory"
+    )
+    parser_restore.add_argument(
+        "-r",
+        "--restore",
+        required=True,
+        metavar="DIR",
+        help="directory to restore to (mandatory). The directory will be created if needed",
+    )
+    parser_restore.add_argument(
+        "snapshot",
+        metavar="SNAPSHOT",
+        nargs="?",
+        default="latest",
+        help="snapshot to restore from (default: %(default)s)",
+    )
+
+    subparsers.add_parser("dockerdr", help="restore all docker volumes")
+    subparsers.add_parser("snapshots", help="list the snapshots in the repository")
+    subparsers.add_parser("run", help="run the restic tool")
+    subparsers.add_parser("exists", help="check whether the repository exists")
+    subparsers.add_parser("check", help="check the configuration file")
+
+    return parser
+
+
+class Arguments:
+    """Parses the arguments for the restictool"""
+
     def __init__(self):
         self.tool_arguments = None
         self.restic_arguments = None
@@ -28,88 +158,7 @@ class Arguments:
 
         Returns: a tuple of the restictol arguments as a dict and the restic ones as a list
         """
-        parser = argparse.ArgumentParser(
-            prog="restictool",
-            formatter_class=argparse.RawDescriptionHelpFormatter,
-            description="A Python wrapper for the dockerized restic tool (v"+self.version+")",
-            epilog=self._HELP_EPILOG,
-        )
-
-        parser.add_argument(
-            "-c",
-            "--config",
-            default=Settings.DEFAULT_CONFIGURATION_FILE,
-            metavar="FILE",
-            type=argparse.FileType("r"),
-            help="the configuration file (default: %(default)s)",
-        )
-        parser.add_argument(
-            "--cache",
-            default=Settings.DEFAULT_CACHE_DIR,
-            metavar="DIR",
-            help="the cache directory (default: %(default)s)",
-        )
-        parser.add_argument(
-            "--image",
-            default=Settings.DEFAULT_IMAGE,
-            help="the docker restic image name (default: %(default)s)",
-        )
-        parser.add_argument(
-            "--force-pull",
-            action="store_true",
-            help="force pulling of the docker image first",
-        )
-
-        parser.add_argument(
-            "--log-level",
-            choices=["critical", "error", "warning", "info", "debug"],
-            default="warning",
-            help="set the logging level (default: %(default)s)",
-        )
-
-        parser.add_argument(
-            "-q",
-            "--quiet",
-            action="store_true",
-            help="silence output from the restic",
-        )
-
-        subparsers = parser.add_subparsers(
-            dest="subcommand",
-            required=True,
-            title="subcommands",
-            help="mode of the operation",
-        )
-
-        parser_backup = subparsers.add_parser(
-            "backup", help="backup the sources specified in the configuration file"
-        )
-
-        parser_restore = subparsers.add_parser(
-            "restore", help="restore a snapshot into the specified directory"
-        )
-        parser_restore.add_argument(
-            "-r",
-            "--restore",
-            required=True,
-            metavar="DIR",
-            help="directory to restore to (mandatory). The directory will be created if needed",
-        )
-        parser_restore.add_argument(
-            "snapshot",
-            metavar="SNAPSHOT",
-            nargs="?",
-            default="latest",
-            help="snapshot to restore from (default: %(default)s)",
-        )
-
-        subparsers.add_parser("dockerdr", help="restore all docker volumes")
-        subparsers.add_parser("snapshots", help="list the snapshots in the repository")
-        subparsers.add_parser("run", help="run the restic tool")
-        subparsers.add_parser("exists", help="check whether the repository exists")
-        subparsers.add_parser("check", help="check the configuration file")
-
-        parsed_args = parser.parse_known_args(arguments)
+        parsed_args = _build_parser(self.version).parse_known_args(arguments)
         restic_args = parsed_args[1]
 
         if len(restic_args) > 0 and restic_args[0] == "--":
@@ -125,13 +174,16 @@ class Arguments:
         settings.subcommand = SubCommand[self.tool_arguments["subcommand"].upper()]
         settings.image = self.tool_arguments["image"]
         settings.force_pull = self.tool_arguments["force_pull"]
-        settings.configuration_stream = self.tool_arguments["config"]
+        settings.pull_ttl = self.tool_arguments["pull_ttl"]
+        settings.configuration_file = self.tool_arguments["config"]
         settings.cache_directory = self.tool_arguments["cache"]
         settings.log_level = self.tool_arguments["log_level"].upper()
         settings.quiet = self.tool_arguments["quiet"]
         if "restore" in self.tool_arguments:
             settings.restore_directory = self.tool_arguments["restore"]
             settings.restore_snapshot = self.tool_arguments["snapshot"]
+        if "parallel" in self.tool_arguments:
+            settings.parallel = self.tool_arguments["parallel"]
         settings.restic_arguments = self.restic_arguments
 
         return settings
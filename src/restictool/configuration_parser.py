@@ -1,16 +1,33 @@
 """Parses the configuration for the restictool
 """
 
+import functools
 import io
 import platform
 import re
 import os
 
+import yaml
 from schema import SchemaError
-from yaml import load, FullLoader
 
 from .configuration_validator import validate
 
+# Use the libyaml-based loader if PyYAML has been built with it
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_yaml(data):
+    """Parse the YAML text. The result is shared between the callers
+    passing the same text and must not be modified."""
+    return yaml.load(data, Loader=_YamlLoader)
+
+
+@functools.cache
+def _default_hostname() -> str:
+    """Return the lowercased host name, which does not change while running"""
+    return platform.node().lower()
+
 
 class Configuration:
     """Parses the configuration given by a stream
@@ -40,18 +57,23 @@ class Configuration:
         Items are the (name, path) tuples.
     """
 
-    _FORBIDDEN_ENV_VARS = [
-        "RESTIC_REPOSITORY",
-        "RESTIC_REPOSITORY_FILE",
-        "RESTIC_PASSWORD",
-        "RESTIC_PASSWORD_FILE",
-        "RESTIC_PASSWORD_COMMAND",
-        "RESTIC_CACHE_DIR",
-        "TMPDIR",
-    ]
+    _FORBIDDEN_ENV_VARS = frozenset(
+        [
+            "RESTIC_REPOSITORY",
+            "RESTIC_REPOSITORY_FILE",
+            "RESTIC_PASSWORD",
+            "RESTIC_PASSWORD_FILE",
+            "RESTIC_PASSWORD_COMMAND",
+            "RESTIC_CACHE_DIR",
+            "TMPDIR",
+        ]
+    )
 
+    _ANONYMOUS_VOLUME_MIN_LENGTH = 48
     _ANONYMOUS_VOLUME_REGEX = re.compile(r"^[0-9a-fA-f]{48,}$")
 
+    _PEEK_SIZE = 4096
+
     _FORGET_DEFAULT = [
         "--keep-daily",
         "7",
@@ -71,14 +93,21 @@ class Configuration:
         self.volumes_to_exclude = []
         self.localdirs_to_backup = []
         self.metrics_path = None
+        self._volumes_to_backup_set = frozenset()
+        self._volumes_to_exclude_set = frozenset()
+        self._options = {}
+        self._volumes_by_name = {}
+        self._wildcard_volume = None
+        self._localdirs_by_name = {}
+        self._options_cache = {}
 
     def load(self, stream, close=True) -> None:
         """Loads, parses and validates the configuration from a stream.
 
         Parameters
         ----------
-        stream : io.IOBase | str
-            Stream to read the configuration from.
+        stream : io.IOBase | str | bytes
+            Stream or buffer to read the configuration from.
         close : bool, optional
             If the stream is an instance of io.IOBase and the close argument is True,
             it will be closed. The default is True.
@@ -89,14 +118,24 @@ class Configuration:
             If the configuration is invalid.
         """
         try:
-            config = load(stream, Loader=FullLoader)
+            if isinstance(stream, (str, bytes)):
+                data = stream
+            elif isinstance(stream, bytearray):
+                data = bytes(stream)
+            else:
+                # Let the parser scan a single buffer instead of reading in chunks
+                data = stream.read()
+
+            # The validation below copies the configuration, the parsed one
+            # stays untouched
+            config = _parse_yaml(data)
         except Exception as ex:
             raise ValueError(
                 "configuration invalid\n" + str(ex.with_traceback(None))
             ) from None
-
-        if isinstance(stream, io.IOBase) and close:
-            stream.close()
+        finally:
+            if isinstance(stream, io.IOBase) and close:
+                stream.close()
 
         try:
             self.configuration = validate(config)
@@ -110,7 +149,7 @@ class Configuration:
         if "host" in self.configuration["repository"]:
             self.hostname = self.configuration["repository"]["host"]
         else:
-            self.hostname = platform.node().lower()
+            self.hostname = _default_hostname()
 
         if "network_from" in self.configuration["repository"]:
             self.network_from = self.configuration["repository"]["network_from"]
@@ -126,6 +165,7 @@ class Configuration:
             self.metrics_path += ".prom"
 
         self.volumes_to_backup = []
+        self.volumes_to_exclude = []
         self.backup_all_volumes = False
 
         if "volumes" in self.configuration:
@@ -138,6 +178,9 @@ class Configuration:
                     break
                 self.volumes_to_backup.append(vol["name"])
 
+        self._volumes_to_backup_set = frozenset(self.volumes_to_backup)
+        self._volumes_to_exclude_set = frozenset(self.volumes_to_exclude)
+
         self.localdirs_to_backup = []
         if "localdirs" in self.configuration:
             for ldir in self.configuration["localdirs"]:
@@ -151,6 +194,76 @@ class Configuration:
         if self.is_prune_specified() and self.configuration["options"]["prune"] is None:
             self.configuration["options"]["prune"] = []
 
+        # Index the options and the entries, the first entry with a name wins
+        self._options = self.configuration.get("options", {})
+        self._volumes_by_name = {
+            vol["name"]: vol for vol in reversed(self.configuration.get("volumes", []))
+        }
+        self._wildcard_volume = self._volumes_by_name.get("*")
+        self._localdirs_by_name = {
+            ldir["name"]: ldir
+            for ldir in reversed(self.configuration.get("localdirs", []))
+        }
+        self._options_cache = {}
+
+    @staticmethod
+    def peek_repository(path: str) -> dict:
+        """Reads the ``repository`` section of a configuration file without
+        parsing the rest of it.
+
+        Only the beginning of the file is parsed if the section is complete
+        there, otherwise the whole file is. The section is not validated.
+
+        Parameters
+        ----------
+        path : str
+            Path of the configuration file.
+
+        Returns
+        -------
+        dict
+            The ``repository`` section of the configuration.
+
+        Raises
+        ------
+        ValueError
+            If the configuration does not contain a repository section.
+        """
+        with open(path, "rb") as stream:
+            data = stream.read(Configuration._PEEK_SIZE)
+            complete = len(data) < Configuration._PEEK_SIZE
+
+            if not complete:
+                # Cut at the last line break so that no value gets truncated
+                data = data[: data.rfind(b"\n") + 1]
+
+            try:
+                config = yaml.load(data, Loader=_YamlLoader)
+            except Exception:  # pylint: disable=broad-except
+                config = None
+
+            # Unless the whole file has been read, the section is only known
+            # to be complete if another one follows it
+            if not complete and (
+                not isinstance(config, dict)
+                or "repository" not in config
+                or next(reversed(config)) == "repository"
+            ):
+                stream.seek(0)
+                try:
+                    config = yaml.load(stream.read(), Loader=_YamlLoader)
+                except Exception as ex:
+                    raise ValueError(
+                        "configuration invalid\n" + str(ex.with_traceback(None))
+                    ) from None
+
+        if not isinstance(config, dict) or not isinstance(
+            config.get("repository"), dict
+        ):
+            raise ValueError("configuration invalid: no repository section")
+
+        return config["repository"]
+
     def create_env_vars(self) -> None:
         """Retrieves the environment variables the restic is to be executed with.
 
@@ -170,9 +283,11 @@ class Configuration:
         if "extra" in self.configuration["repository"]:
             self.environment_vars.update(self.configuration["repository"]["extra"])
 
-        for key in self._FORBIDDEN_ENV_VARS:
-            if key in self.environment_vars:
-                raise ValueError(f"configuration invalid: variable {key} is forbidden")
+        forbidden = self._FORBIDDEN_ENV_VARS.intersection(self.environment_vars)
+        if forbidden:
+            raise ValueError(
+                f"configuration invalid: variable {min(forbidden)} is forbidden"
+            )
 
         self.environment_vars["RESTIC_REPOSITORY"] = self.configuration["repository"][
             "location"
@@ -207,64 +322,51 @@ class Configuration:
         Returns
         -------
         list
-            The list of restic command-line options to use.
+            The list of restic command-line options to use. The caller
+            owns the list and may modify it.
         """
 
-        options = []
-
-        if "options" in self.configuration:
-            if "common" in self.configuration["options"]:
-                options.extend(self.configuration["options"]["common"])
-            if forget and "forget" in self.configuration["options"]:
-                for opt in self.configuration["options"]["forget"]:
-                    if opt == "DEFAULT":
-                        options.extend(self._FORGET_DEFAULT)
-                    else:
-                        options.append(opt)
-            if prune and "prune" in self.configuration["options"]:
-                options.extend(self.configuration["options"]["prune"])
-            if volume and "volume" in self.configuration["options"]:
-                options.extend(self.configuration["options"]["volume"])
-            if localdir and "localdir" in self.configuration["options"]:
-                options.extend(self.configuration["options"]["localdir"])
+        key = (volume, localdir, forget, prune)
 
-        if volume:
-            options.extend(self._get_volume_options(volume))
-
-        if localdir:
-            options.extend(self._get_localdir_options(localdir))
+        try:
+            options = self._options_cache[key]
+        except KeyError:
+            options = self._build_options(volume, localdir, forget, prune)
+            self._options_cache[key] = options
 
-        return options
+        return list(options)
 
-    def _get_volume_options(self, volume: str) -> list:
+    def _build_options(
+        self, volume: str, localdir: str, forget: bool, prune: bool
+    ) -> tuple:
         options = []
 
-        if "volumes" in self.configuration:
-            for vol in self.configuration["volumes"]:
-                if volume == vol["name"]:
-                    if "options" in vol:
-                        options.extend(vol["options"])
-                    break
-            else:
-                for vol in self.configuration["volumes"]:
-                    if vol["name"] == "*":
-                        if "options" in vol:
-                            options.extend(vol["options"])
-                        break
-
-        return options
+        if "common" in self._options:
+            options.extend(self._options["common"])
+        if forget and "forget" in self._options:
+            for opt in self._options["forget"]:
+                if opt == "DEFAULT":
+                    options.extend(self._FORGET_DEFAULT)
+                else:
+                    options.append(opt)
+        if prune and "prune" in self._options:
+            options.extend(self._options["prune"])
+        if volume and "volume" in self._options:
+            options.extend(self._options["volume"])
+        if localdir and "localdir" in self._options:
+            options.extend(self._options["localdir"])
 
-    def _get_localdir_options(self, localdir: str) -> list:
-        options = []
+        if volume:
+            vol = self._volumes_by_name.get(volume) or self._wildcard_volume
+            if vol and "options" in vol:
+                options.extend(vol["options"])
 
-        if "localdirs" in self.configuration:
-            for ldir in self.configuration["localdirs"]:
-                if localdir == ldir["name"]:
-                    if "options" in ldir:
-                        options.extend(ldir["options"])
-                    break
+        if localdir:
+            ldir = self._localdirs_by_name.get(localdir)
+            if ldir and "options" in ldir:
+                options.extend(ldir["options"])
 
-        return options
+        return tuple(options)
 
     def is_volume_backed_up(self, volume: str) -> bool:
         """Check whether a volume with a specified name is to be backed up.
@@ -283,12 +385,34 @@ class Configuration:
         """
 
         if self.backup_all_volumes:
+            # Anonymous volume names are too long to be anything else
             return (
-                not self._ANONYMOUS_VOLUME_REGEX.match(volume)
-                and not volume in self.volumes_to_exclude
-            )
+                len(volume) < self._ANONYMOUS_VOLUME_MIN_LENGTH
+                or not self._ANONYMOUS_VOLUME_REGEX.match(volume)
+            ) and volume not in self._volumes_to_exclude_set
+
+        return volume in self._volumes_to_backup_set
+
+    def filter_volumes_to_backup(self, volumes) -> list:
+        """Select the volumes to be backed up, see ``is_volume_backed_up()``.
+
+        Parameters
+        ----------
+        volumes : iterable
+            The names of the volumes.
 
-        return volume in self.volumes_to_backup
+        Returns
+        -------
+        list
+            The sorted names of the volumes that should be backed up.
+        """
+
+        if not self.backup_all_volumes:
+            return sorted(self._volumes_to_backup_set.intersection(volumes))
+
+        return sorted(
+            volume for volume in set(volumes) if self.is_volume_backed_up(volume)
+        )
 
     def is_forget_specified(self) -> bool:
         """Check whether a ``forget`` should be run after finishing the backup.
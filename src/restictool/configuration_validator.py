@@ -1,13 +1,21 @@
 """Validates the configuration schema"""
 
-from schema import Schema, And, Or, Optional, Use
+import copy
+
+from schema import Schema, SchemaError, And, Or, Optional, Use
+
+NON_EMPTY_STR = And(str, len)
+"""A non-empty string"""
+
+NON_EMPTY_OPTION = And(Use(str), len)
+"""A command-line option, converted to a non-empty string"""
 
 REPOSITORY_SCHEMA = Schema(
     {
-        "location": And(str, lambda s: len(s) > 0),
-        "password": And(str, lambda s: len(s) > 0),
-        Optional("host"): And(str, lambda s: len(s) > 0),
-        Optional("network_from"): And(str, lambda s: len(s) > 0),
+        "location": NON_EMPTY_STR,
+        "password": NON_EMPTY_STR,
+        Optional("host"): NON_EMPTY_STR,
+        Optional("network_from"): NON_EMPTY_STR,
         Optional("authentication"): {str: str},
         Optional("extra"): {str: str},
     },
@@ -15,34 +23,34 @@ REPOSITORY_SCHEMA = Schema(
 
 METRICS_SCHEMA = Schema(
     {
-        "directory": And(str, lambda s: len(s) > 0),
-        Optional("suffix"): And(str, lambda s: len(s) > 0),
+        "directory": NON_EMPTY_STR,
+        Optional("suffix"): NON_EMPTY_STR,
     },
 )
 
 OPTIONS_SCHEMA = Schema(
     {
-        Optional("common"): [And(Use(str), lambda s: len(s) > 0)],
-        Optional("forget"): [And(Use(str), lambda s: len(s) > 0)],
-        Optional("prune"): Or([And(Use(str), lambda s: len(s) > 0)], None),
-        Optional("volume"): [And(Use(str), lambda s: len(s) > 0)],
-        Optional("localdir"): [And(Use(str), lambda s: len(s) > 0)],
+        Optional("common"): [NON_EMPTY_OPTION],
+        Optional("forget"): [NON_EMPTY_OPTION],
+        Optional("prune"): Or([NON_EMPTY_OPTION], None),
+        Optional("volume"): [NON_EMPTY_OPTION],
+        Optional("localdir"): [NON_EMPTY_OPTION],
     },
 )
 
 VOLUME_SCHEMA = Schema(
     {
-        "name": And(str, lambda s: len(s) > 0),
-        Optional("exclude"): [And(Use(str), lambda s: len(s) > 0)],
-        Optional("options"): [And(Use(str), lambda s: len(s) > 0)],
+        "name": NON_EMPTY_STR,
+        Optional("exclude"): [NON_EMPTY_OPTION],
+        Optional("options"): [NON_EMPTY_OPTION],
     },
 )
 
 LOCALDIR_SCHEMA = Schema(
     {
-        "name": And(str, lambda s: len(s) > 0),
-        "path": And(str, lambda s: len(s) > 0),
-        Optional("options"): [And(Use(str), lambda s: len(s) > 0)],
+        "name": NON_EMPTY_STR,
+        "path": NON_EMPTY_STR,
+        Optional("options"): [NON_EMPTY_OPTION],
     },
 )
 
@@ -57,6 +65,146 @@ SCHEMA = Schema(
     },
 )
 
+# The schema objects above document the configuration format. Validation
+# itself is done by the specialized functions below, which check the same
+# rules without walking the schema tree on every call.
+
+
+def _non_empty_str(value):
+    if not isinstance(value, str) or not value:
+        raise SchemaError(f"{value!r} should be a non-empty string")
+    return value
+
+
+def _str_dict(value):
+    if not isinstance(value, dict):
+        raise SchemaError(f"{value!r} should be instance of 'dict'")
+    if not value:
+        # The schema library treats the str key of {str: str} as required
+        raise SchemaError("Missing key: <class 'str'>")
+    for key, item in value.items():
+        if not isinstance(key, str) or not isinstance(item, str):
+            raise SchemaError(f"{key!r}: {item!r} should be a string to string entry")
+    return dict(value)
+
+
+def _any_dict(value):
+    if not isinstance(value, dict):
+        raise SchemaError(f"{value!r} should be instance of 'dict'")
+    return copy.deepcopy(value)
+
+
+def _option_list(value):
+    if not isinstance(value, list):
+        raise SchemaError(f"{value!r} should be instance of 'list'")
+    options = [str(opt) for opt in value]
+    if not all(options):
+        raise SchemaError(f"{value!r} should not contain empty options")
+    return options
+
+
+def _optional_option_list(value):
+    return None if value is None else _option_list(value)
+
+
+def _mapping(value, required: dict, optional: dict) -> dict:
+    """Validate a dict given the validators of its required and optional keys"""
+    if not isinstance(value, dict):
+        raise SchemaError(f"{value!r} should be instance of 'dict'")
+
+    validated = {}
+    wrong_keys = []
+
+    # Report the errors in the same order as the schema library
+    for key, item in value.items():
+        validator = required.get(key) or optional.get(key)
+        if validator is None:
+            wrong_keys.append(key)
+            continue
+        try:
+            validated[key] = validator(item)
+        except SchemaError as ex:
+            raise SchemaError(f"Key {key!r} error:\n{ex}") from None
+
+    for key in required:
+        if key not in value:
+            raise SchemaError(f"Missing key: {key!r}")
+
+    if wrong_keys:
+        raise SchemaError(f"Wrong key {wrong_keys[0]!r} in {value!r}")
+
+    return validated
+
+
+def _list_of(item_validator):
+    def validate_list(value):
+        if not isinstance(value, list):
+            raise SchemaError(f"{value!r} should be instance of 'list'")
+        return [item_validator(item) for item in value]
+
+    return validate_list
+
+
+def _repository(value):
+    return _mapping(
+        value,
+        {"location": _non_empty_str, "password": _non_empty_str},
+        {
+            "host": _non_empty_str,
+            "network_from": _non_empty_str,
+            "authentication": _str_dict,
+            "extra": _str_dict,
+        },
+    )
+
+
+def _metrics(value):
+    return _mapping(value, {"directory": _non_empty_str}, {"suffix": _non_empty_str})
+
+
+def _options(value):
+    return _mapping(
+        value,
+        {},
+        {
+            "common": _option_list,
+            "forget": _option_list,
+            "prune": _optional_option_list,
+            "volume": _option_list,
+            "localdir": _option_list,
+        },
+    )
+
+
+def _volume(value):
+    return _mapping(
+        value,
+        {"name": _non_empty_str},
+        {"exclude": _option_list, "options": _option_list},
+    )
+
+
+def _localdir(value):
+    return _mapping(
+        value,
+        {"name": _non_empty_str, "path": _non_empty_str},
+        {"options": _option_list},
+    )
+
+
+def _configuration(value):
+    return _mapping(
+        value,
+        {"repository": _repository},
+        {
+            "logging": _any_dict,
+            "metrics": _metrics,
+            "options": _options,
+            "volumes": _list_of(_volume),
+            "localdirs": _list_of(_localdir),
+        },
+    )
+
 
 def validate(config):
     """Validate the configuration file.
@@ -69,7 +217,13 @@ def validate(config):
     Returns
     -------
     object
-        Validated configuration.
+        Validated configuration. It does not share any containers with
+        ``config``, the caller may modify it.
+
+    Raises
+    ------
+    SchemaError
+        If the configuration does not conform to :data:`SCHEMA`.
     """
 
-    return SCHEMA.validate(config)
+    return _configuration(config)
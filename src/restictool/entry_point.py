@@ -4,19 +4,22 @@ top-level ``__main__``.
 
 import sys
 
-from .restic_tool import ResticTool, ResticToolException
 from .argument_parser import Arguments
 
-# pylint: disable=broad-except
+# pylint: disable=broad-except,import-outside-toplevel
 
 
 def run():
     """Fetch and parse the command-line arguments and run the tool."""
 
-    try:
-        arguments = Arguments()
-        arguments.parse()
+    arguments = Arguments()
+    arguments.parse()
+
+    # Importing the tool pulls in the docker SDK, so do not do it
+    # when only the help is shown or the arguments are invalid
+    from .restic_tool import ResticTool, ResticToolException
 
+    try:
         tool = ResticTool(arguments.to_settings())
         tool.setup()
         tool.run()
@@ -4,7 +4,10 @@ Transform the restic metrics from the json snapshot output to prometheus metrics
 Only works for restic >= 0.17.0
 """
 
+import calendar
 import os
+import re
+from datetime import datetime
 from dateutil import parser
 from prometheus_client import Gauge, CollectorRegistry, write_to_textfile
 
@@ -16,6 +19,11 @@ class Metrics:
     Transforms the snapshot summary to the prometheus text format
     """
 
+    _RFC3339_REGEX = re.compile(
+        r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d+))?"
+        r"(?:Z|([+-])(\d\d):(\d\d))"
+    )
+
     def __init__(self, configuration: Configuration):
         """Initialize metrics collector
 
@@ -57,13 +65,38 @@ class Metrics:
         Unfortunately the dateutil.fromisoformat() cannot handle nanoseconds
         nor the 'Z' suffix until 3.11, while the Debian bookworm has 3.10.
 
-        Dateutil is able to do that.
+        Dateutil is able to do that, but it is slow. The RFC 3339 times
+        restic writes are converted directly, with the same truncation
+        to microseconds. Anything else is left to the dateutil.
 
         Returns:
             int: Time in seconds from epoch
         """
         # return int(datetime.fromisoformat(time.split('.')[0].split('Z')[0] + "+00:00").timestamp())
-        return parser.isoparse(time).timestamp()
+        match = Metrics._RFC3339_REGEX.fullmatch(time)
+        if not match:
+            return parser.isoparse(time).timestamp()
+
+        fields = tuple(int(field) for field in match.groups()[:6])
+        fraction, sign, tz_h, tz_m = match.groups()[6:]
+        tz_h, tz_m = (int(tz_h), int(tz_m)) if sign else (0, 0)
+
+        # calendar.timegm() does not range-check the fields, leave anything
+        # out of range to the dateutil
+        try:
+            datetime(*fields)
+        except ValueError:
+            return parser.isoparse(time).timestamp()
+        if tz_h > 23 or tz_m > 59:
+            return parser.isoparse(time).timestamp()
+
+        offset = tz_h * 3600 + tz_m * 60
+        seconds = calendar.timegm(fields) + (-offset if sign == "+" else offset)
+
+        microseconds = int(fraction[:6].ljust(6, "0")) if fraction else 0
+
+        # Divide the integer like datetime.timestamp() does to get the same float
+        return (seconds * 1000000 + microseconds) / 1000000
 
     def set_snapshot(self, snapshot: dict):
         """Set the metrics from a snapshot JSON
@@ -72,11 +105,13 @@ class Metrics:
             snapshot (dict): A snapshot item from the restic snapshots --json command
         """
 
-        hostname = snapshot["hostname"]
-        repository = self.configuration.configuration["repository"]["location"]
-        path = snapshot["paths"][0]
+        labels = (
+            snapshot["hostname"],
+            self.configuration.configuration["repository"]["location"],
+            snapshot["paths"][0],
+        )
 
-        self.backup_time.labels(hostname, repository, path).set(
+        self.backup_time.labels(*labels).set(
             Metrics.time_string_to_time_stamp(snapshot["time"])
         )
 
@@ -89,9 +124,9 @@ class Metrics:
             )
             files = int(summary["total_files_processed"])
             size = int(summary["total_bytes_processed"])
-            self.backup_duration.labels(hostname, repository, path).set(duration)
-            self.backup_files.labels(hostname, repository, path).set(files)
-            self.backup_size.labels(hostname, repository, path).set(size)
+            self.backup_duration.labels(*labels).set(duration)
+            self.backup_files.labels(*labels).set(files)
+            self.backup_size.labels(*labels).set(size)
         except KeyError:
             pass
 
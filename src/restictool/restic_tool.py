@@ -2,20 +2,42 @@
 Fetch the arguments, parse the configuration and run the selected functionality
 """
 
+import functools
 import json
 import logging
 import logging.config
 import os
-import docker
+import struct
+import sys
+import tempfile
+import threading
 import yaml
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .settings import Settings, SubCommand
 from .configuration_parser import Configuration
 from .metrics import Metrics
 
 
+_DOCKER_ENVIRONMENT = ("DOCKER_HOST", "DOCKER_TLS_VERIFY", "DOCKER_CERT_PATH")
+
+
+@functools.lru_cache(maxsize=1)
+def _docker_client(_environment: tuple, parallel: int):
+    """Create the docker client, reusing it as long as the docker-related
+    environment and the parallelism (the cache key) stay the same.
+    """
+    # The docker SDK is expensive to import and not needed for a check
+    import docker  # pylint: disable=import-outside-toplevel
+
+    # Keep a connection per concurrent backup alive instead of reconnecting
+    return docker.from_env(
+        max_pool_size=max(docker.constants.DEFAULT_MAX_POOL_SIZE, parallel)
+    )
+
+
 class ResticToolException(Exception):
     """Throw if an error prevents the tool to continue. If invoked from a command
     line exit wit the code provided.
@@ -42,12 +64,58 @@ class ResticTool:
 
     _OWN_HOSTNAME = "restictool.local"
     _BRIDGE_NETWORK_NAME = "bridge"
+    _OUTPUT_FLUSH_INTERVAL = 0.5
+    _PULLS_FILE = ".restictool_pulls.json"
+    _WARM_ENTRYPOINT = ["tail"]
+    _WARM_COMMAND = ["-f", "/dev/null"]
+    _DEFAULT_RESTIC_ENTRYPOINT = ["restic"]
+    _READ_SIZE = 65536
+    _EXEC_EXIT_TIMEOUT = 30.0
+    _FRAME_HEADER = struct.Struct(">BxxxI")
+
+    _COMMAND_MUX = {
+        SubCommand.RUN: "_run_general",
+        SubCommand.BACKUP: "_run_backup",
+        SubCommand.RESTORE: "_run_restore",
+        SubCommand.DOCKERDR: "_run_dockerdr",
+        SubCommand.SNAPSHOTS: "_run_general",
+        SubCommand.EXISTS: "_run_exists",
+    }
+    """Names of the methods running the sub-commands"""
+
+    _DOCKER_SUBCOMMANDS = frozenset(_COMMAND_MUX)
+    """Sub-commands running restic in docker"""
+
+    _RESTIC_ARGUMENTS_MUX = {
+        SubCommand.RUN: "_restic_arguments_run",
+        SubCommand.BACKUP: "_restic_arguments_backup",
+        SubCommand.RESTORE: "_restic_arguments_restore",
+        SubCommand.SNAPSHOTS: "_restic_arguments_snapshots",
+        SubCommand.EXISTS: "_restic_arguments_exists",
+    }
+    """Names of the methods adding the sub-command specific restic arguments"""
+
+    _CACHE_OPTIONS = ("--cache-dir", "/cache")
+
+    _LOG_LEVELS = {
+        logging.critical: logging.CRITICAL,
+        logging.fatal: logging.CRITICAL,
+        logging.error: logging.ERROR,
+        logging.warning: logging.WARNING,
+        logging.info: logging.INFO,
+        logging.debug: logging.DEBUG,
+    }
+    """Levels of the module-level logging functions"""
 
     def __init__(self, settings: Settings):
         self.settings = settings
         self.configuration = None
         self.client = None
         self.own_ip_address = None
+        self._network_options = None
+        self._base_mounts = None
+        self._restic_entrypoint = self._DEFAULT_RESTIC_ENTRYPOINT
+        self._output_lock = threading.Lock()
 
     def log(self, log_function, *args, entity=None, elapsed=None):
         """Log the message, filling out the extras.
@@ -63,6 +131,11 @@ class ResticTool:
         elapsed : float | None
             Elapsed time of the operation, if known
         """
+        # Do not build the extras for a message that would be dropped anyway
+        level = self._LOG_LEVELS.get(log_function)
+        if level is not None and not logging.getLogger().isEnabledFor(level):
+            return
+
         log_function(
             *args,
             extra={
@@ -122,7 +195,11 @@ formatters:
         self.configuration = Configuration()
 
         try:
-            self.configuration.load(self.settings.configuration_stream)
+            if self.settings.configuration_stream is not None:
+                self.configuration.load(self.settings.configuration_stream)
+            else:
+                with open(self.settings.configuration_file, "rb") as stream:
+                    self.configuration.load(stream.read())
         except Exception as ex:
             logging.fatal(
                 "Could not load the configuration %s", self.format_exception(ex)
@@ -151,22 +228,23 @@ formatters:
         else:
             self.configure_default_logging()
 
-        if self.settings.subcommand not in [
-            SubCommand.CHECK,
-            SubCommand.RUN,
-            SubCommand.BACKUP,
-            SubCommand.DOCKERDR,
-            SubCommand.RESTORE,
-            SubCommand.SNAPSHOTS,
-            SubCommand.EXISTS,
-        ]:
+        if (
+            self.settings.subcommand not in self._DOCKER_SUBCOMMANDS
+            and self.settings.subcommand != SubCommand.CHECK
+        ):
             self.log(logging.fatal, "Unknown command %s", self.settings.subcommand.name)
             raise ResticToolException(
                 16, f"Unknown command {self.settings.subcommand.name}"
             )
 
-        if self.settings.subcommand != SubCommand.CHECK:
-            self.client = docker.from_env()
+        if self.settings.subcommand in self._DOCKER_SUBCOMMANDS:
+            self.client = _docker_client(
+                tuple(os.environ.get(name) for name in _DOCKER_ENVIRONMENT),
+                self.settings.parallel,
+            )
+
+        self._network_options = None
+        self._prepare_base_mounts()
 
     def run(self):
         """Runs the tool according to the settings and the configuration.
@@ -183,20 +261,11 @@ formatters:
                 logging.info, "Configuration is valid"
             )  # Would not come here if invalid
         else:
-            command_mux = {
-                SubCommand.RUN: self._run_general,
-                SubCommand.BACKUP: self._run_backup,
-                SubCommand.RESTORE: self._run_restore,
-                SubCommand.DOCKERDR: self._run_dockerdr,
-                SubCommand.SNAPSHOTS: self._run_general,
-                SubCommand.EXISTS: self._run_exists,
-            }
-
-            self._pull_if_needed()
             self._create_directories()
+            self._pull_if_needed()
             self._find_own_network()
 
-            exit_code = command_mux[self.settings.subcommand]()
+            exit_code = getattr(self, self._COMMAND_MUX[self.settings.subcommand])()
 
             if exit_code != 0:
                 if self.settings.subcommand != SubCommand.EXISTS:
@@ -218,82 +287,58 @@ formatters:
 
     def _run_backup(self) -> int:
         """Run the backup"""
-        backed_up = False
         exit_code = 0
 
-        volumes = [
-            x.name
-            for x in self.client.volumes.list()
-            if self.configuration.is_volume_backed_up(x.name)
-        ]
-
-        volumes.sort()
-
-        for volume in volumes:
-            self.log(logging.debug, "Backing up volume", entity=volume)
-            backed_up = True
-            start_time = time.monotonic()
-
-            code, _ = self._run_docker(
-                command=self._get_restic_arguments(volume=volume),
-                env=self.configuration.environment_vars,
-                volumes=self._get_docker_mounts(volume=volume),
-            )
-
-            if code == 0:
-                self.log(
-                    logging.info,
-                    "Successfully backed up volume",
-                    entity=volume,
-                    elapsed=time.monotonic() - start_time,
-                )
-            else:
-                self.log(
-                    logging.error,
-                    "Backing up volume failed",
-                    entity=volume,
-                    elapsed=time.monotonic() - start_time,
-                )
+        sources = [(volume, None) for volume in self._get_volumes_to_backup()]
+        sources.extend(
+            (None, local_dir) for local_dir in self.configuration.localdirs_to_backup
+        )
+        backed_up = len(sources) > 0
+
+        env = self.configuration.environment_vars
+
+        # Starting a container per source is expensive, run them all in one
+        container = None
+        if len(sources) > 1:
+            # Binds as "host:target:mode" so that a host path shared by
+            # several sources gets mounted at each of their targets
+            binds = {}
+            for volume, localdir in sources:
+                for host, bind in self._get_docker_mounts(
+                    volume=volume, localdir=localdir
+                ).items():
+                    binds[f"{host}:{bind['bind']}:{bind['mode']}"] = None
+            container = self._start_warm_container(env, list(binds))
 
-            if code > exit_code:
-                exit_code = code
+        try:
+            # The sources are independent, restic only takes a shared lock
+            # for a backup
+            with ThreadPoolExecutor(max_workers=self.settings.parallel) as executor:
+                for code in executor.map(
+                    lambda src: self._backup_source(env, container, *src), sources
+                ):
+                    if code > exit_code:
+                        exit_code = code
+        finally:
+            if container:
+                self.client.api.remove_container(container, force=True)
 
-        for local_dir in self.configuration.localdirs_to_backup:
-            self.log(logging.debug, "Backing up local directory", entity=local_dir[0])
-            backed_up = True
-            start_time = time.monotonic()
+        if backed_up:
+            forgotten = self.configuration.is_forget_specified()
 
-            code, _ = self._run_docker(
-                command=self._get_restic_arguments(localdir_name=local_dir[0]),
-                env=self.configuration.environment_vars,
-                volumes=self._get_docker_mounts(localdir=local_dir),
-            )
+            if forgotten:
+                # Prune in the same run, the repository is only opened once
+                prune = self.configuration.is_prune_specified()
 
-            if code == 0:
                 self.log(
-                    logging.info,
-                    "Successfully backed up local directory",
-                    entity=local_dir[0],
-                    elapsed=time.monotonic() - start_time,
+                    logging.debug,
+                    "Forgetting expired backups%s",
+                    " and pruning the repository" if prune else "",
                 )
-            else:
-                self.log(
-                    logging.error,
-                    "Backing up local directory failed",
-                    entity=local_dir[0],
-                    elapsed=time.monotonic() - start_time,
-                )
-
-            if code > exit_code:
-                exit_code = code
-
-        if backed_up:
-            if self.configuration.is_forget_specified():
-                self.log(logging.debug, "Forgetting expired backups")
                 start_time = time.monotonic()
 
                 code, _ = self._run_docker(
-                    command=self._get_restic_arguments(forget=True),
+                    command=self._get_restic_arguments(forget=True, prune=prune),
                     env=self.configuration.environment_vars,
                     volumes=self._get_docker_mounts(),
                 )
@@ -301,20 +346,22 @@ formatters:
                 if code == 0:
                     self.log(
                         logging.info,
-                        "Successfully run forget policy",
+                        "Successfully run forget policy%s",
+                        " and pruned the snapshots" if prune else "",
                         elapsed=time.monotonic() - start_time,
                     )
                 else:
                     self.log(
                         logging.error,
-                        "Running forget policy failed",
+                        "Running forget policy%s failed",
+                        " with prune" if prune else "",
                         elapsed=time.monotonic() - start_time,
                     )
 
                 if code > exit_code:
                     exit_code = code
 
-            if self.configuration.is_prune_specified():
+            if not forgotten and self.configuration.is_prune_specified():
                 self.log(logging.debug, "Pruning the repository")
                 start_time = time.monotonic()
 
@@ -405,14 +452,84 @@ formatters:
 
         return 0
 
+    def _backup_source(
+        self, env: dict, container: str, volume: str = None, localdir: tuple = None
+    ) -> int:
+        """Back up a single volume or local directory, in the given running
+        container if any"""
+        if volume:
+            kind, entity = "volume", volume
+        else:
+            kind, entity = "local directory", localdir[0]
+
+        self.log(logging.debug, "Backing up %s", kind, entity=entity)
+        start_time = time.monotonic()
+
+        command = self._get_restic_arguments(
+            volume=volume, localdir_name=localdir[0] if localdir else None
+        )
+
+        # Tell the interleaved outputs of the concurrent backups apart
+        prefix = f"[{entity}] ".encode() if self.settings.parallel > 1 else None
+
+        if container:
+            code, _ = self._exec_restic(container, command, prefix=prefix)
+        else:
+            code, _ = self._run_docker(
+                command=command,
+                env=env,
+                volumes=self._get_docker_mounts(volume=volume, localdir=localdir),
+                prefix=prefix,
+            )
+
+        if code == 0:
+            self.log(
+                logging.info,
+                "Successfully backed up %s",
+                kind,
+                entity=entity,
+                elapsed=time.monotonic() - start_time,
+            )
+        else:
+            self.log(
+                logging.error,
+                "Backing up %s failed",
+                kind,
+                entity=entity,
+                elapsed=time.monotonic() - start_time,
+            )
+
+        return code
+
+    def _get_volumes_to_backup(self) -> list:
+        """Get the sorted names of the volumes to back up"""
+        if self.configuration.backup_all_volumes:
+            candidates = self._list_volumes()
+        elif self.configuration.volumes_to_backup:
+            # The daemon also matches parts of the names, the check below is exact
+            candidates = self._list_volumes(
+                filters={"name": self.configuration.volumes_to_backup}
+            )
+        else:
+            return []
+
+        return self.configuration.filter_volumes_to_backup(
+            vol["Name"] for vol in candidates
+        )
+
+    def _list_volumes(self, filters: dict = None) -> list:
+        """List the volumes as the raw dictionaries returned by the daemon"""
+        # The daemon returns null instead of an empty list
+        return self.client.api.volumes(filters=filters)["Volumes"] or []
+
     def _run_dockerdr(self) -> int:
         """Run the docker volume disaster recovery"""
 
         # Get the volumes
         volumes = {
-            v.attrs["Name"]: v.attrs["Mountpoint"]
-            for v in self.client.volumes.list()
-            if v.attrs["Driver"] == "local"
+            v["Name"]: v["Mountpoint"]
+            for v in self._list_volumes()
+            if v["Driver"] == "local"
         }
 
         # Get the snapshots
@@ -541,6 +658,7 @@ formatters:
             env=self.configuration.environment_vars,
             volumes=self._get_docker_mounts(),
             quiet=True,
+            collect=False,
         )
 
         if exit_code > 0:
@@ -555,9 +673,21 @@ formatters:
 
     def _find_own_network(self):
         """Find own address on the default bridge network"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        if self.own_ip_address is not None:
+            return
+
+        # The containers share the network stack of another one, the address
+        # would not be added to the hosts anyway
+        if self.configuration.network_from:
+            return
+
         try:
-            bridge = self.client.networks.get(self._BRIDGE_NETWORK_NAME, scope="local")
-            self.own_ip_address = bridge.attrs["IPAM"]["Config"][0]["Gateway"]
+            bridge = self.client.api.inspect_network(
+                self._BRIDGE_NETWORK_NAME, scope="local"
+            )
+            self.own_ip_address = bridge["IPAM"]["Config"][0]["Gateway"]
             self.log(
                 logging.debug,
                 "Own address on the '%s' network: %s",
@@ -572,21 +702,157 @@ formatters:
             )
             self.own_ip_address = None
 
+        self._network_options = None
+
     def _pull_if_needed(self):
-        """Pull the image if requested"""
+        """Pull the image if requested or if it is not present"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
         if self.settings.force_pull:
-            image = self.settings.image.split(":")
-            self.log(logging.info, "Pulling image %s", self.settings.image)
-            self.client.images.pull(
-                repository=image[0], tag=image[1] if len(image) > 1 else None
+            if self._is_pulled_recently():
+                self.log(
+                    logging.info,
+                    "Image %s pulled recently, not pulling again",
+                    self.settings.image,
+                )
+            elif self._is_image_current():
+                self.log(
+                    logging.info,
+                    "Image %s is up to date, not pulling",
+                    self.settings.image,
+                )
+                if self.settings.pull_ttl > 0:
+                    self._record_pull()
+            else:
+                self._pull_image()
+            return
+
+        try:
+            self.client.api.inspect_image(self.settings.image)
+        except docker.errors.ImageNotFound:
+            self._pull_image()
+
+    def _pull_image(self):
+        """Pull the image"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        self.log(logging.info, "Pulling image %s", self.settings.image)
+
+        # The tag is split off by the SDK, which also copes with registry
+        # ports and digests. The daemon reports a failed pull in the progress
+        # stream only.
+        for status in self.client.api.pull(
+            self.settings.image, stream=True, decode=True
+        ):
+            if "error" in status:
+                raise docker.errors.APIError(status["error"])
+
+        if self.settings.pull_ttl > 0:
+            self._record_pull()
+
+    def _is_image_current(self) -> bool:
+        """Check whether the local image has the digest the registry reports
+        for it. Only the manifest is fetched from the registry."""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        try:
+            local = self.client.api.inspect_image(self.settings.image)
+            remote = self.client.api.inspect_distribution(self.settings.image)
+            digest = remote["Descriptor"]["digest"]
+        except (docker.errors.APIError, KeyError, TypeError):
+            return False
+
+        return any(
+            repo_digest.endswith("@" + digest)
+            for repo_digest in local.get("RepoDigests") or []
+        )
+
+    def _read_pulls(self) -> dict:
+        """Read the record of the pulled images, empty if unusable"""
+        try:
+            with open(
+                os.path.join(self.settings.cache_directory, self._PULLS_FILE),
+                "r",
+                encoding="utf-8",
+            ) as file:
+                pulls = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        return pulls if isinstance(pulls, dict) else {}
+
+    def _is_pulled_recently(self) -> bool:
+        """Check whether the image was pulled less than ``pull_ttl``
+        seconds ago and is still present with the same digest"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        if self.settings.pull_ttl == 0:
+            return False
+
+        pull = self._read_pulls().get(self.settings.image)
+
+        try:
+            if time.time() - pull["checked"] >= self.settings.pull_ttl:
+                return False
+            digest = pull["digest"]
+        except (KeyError, TypeError):
+            return False
+
+        try:
+            image = self.client.api.inspect_image(self.settings.image)
+        except docker.errors.ImageNotFound:
+            return False
+
+        return digest in (image.get("RepoDigests") or [])
+
+    def _record_pull(self):
+        """Record the time and the digest of the image just pulled"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        path = os.path.join(self.settings.cache_directory, self._PULLS_FILE)
+
+        try:
+            digests = self.client.api.inspect_image(self.settings.image).get(
+                "RepoDigests"
+            )
+
+            pulls = self._read_pulls()
+            pulls[self.settings.image] = {
+                "digest": digests[0] if digests else None,
+                "checked": time.time(),
+            }
+
+            # Write atomically, a concurrent run reads either the old or the new
+            fd, temp_path = tempfile.mkstemp(
+                dir=self.settings.cache_directory, prefix=self._PULLS_FILE
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    json.dump(pulls, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except (OSError, docker.errors.APIError) as ex:
+            self.log(
+                logging.warning,
+                "Could not record the pull in %s: %s",
+                path,
+                self.format_exception(ex),
             )
 
     def _create_directory(self, path: str, name: str):
         """Create a directory if needed"""
         try:
-            if not os.path.exists(path) or not os.path.isdir(path):
-                self.log(logging.info, "Creating %s directory %s", name, path)
+            # Only stat the path if it already exists
+            try:
                 os.makedirs(path, mode=0o755)
+                self.log(logging.info, "Created %s directory %s", name, path)
+            except FileExistsError:
+                if not os.path.isdir(path):
+                    raise
         except Exception as ex:
             self.log(
                 logging.fatal,
@@ -608,12 +874,7 @@ formatters:
         """
         Get the dict that can be used as ``volumes`` argument to run()
         """
-        mounts = {}
-
-        mounts[self.settings.cache_directory] = {
-            "bind": "/cache",
-            "mode": "rw",
-        }
+        mounts = self._base_mounts.copy()
 
         if self.settings.subcommand == SubCommand.BACKUP:
             if volume:
@@ -628,14 +889,23 @@ formatters:
                     "mode": "rw",
                 }
 
+        return mounts
+
+    def _prepare_base_mounts(self):
+        """Prepare the mounts that are the same for every container"""
+        self._base_mounts = {
+            self.settings.cache_directory: {
+                "bind": "/cache",
+                "mode": "rw",
+            }
+        }
+
         if self.settings.subcommand == SubCommand.RESTORE:
-            mounts[self.settings.restore_directory] = {
+            self._base_mounts[self.settings.restore_directory] = {
                 "bind": "/target",
                 "mode": "rw",
             }
 
-        return mounts
-
     def _get_restic_arguments(
         self,
         volume: str = None,
@@ -647,40 +917,11 @@ formatters:
         Get the restic arguments for the specified command and eventually
         volume or local directory
         """
-        options = ["--cache-dir", "/cache"]
+        options = list(self._CACHE_OPTIONS)
 
-        if self.settings.subcommand == SubCommand.RUN:
-            options.extend(self.configuration.get_options())
-        elif self.settings.subcommand == SubCommand.EXISTS:
-            options.extend(["cat", "config"])
-            options.extend(self.configuration.get_options())
-        elif self.settings.subcommand == SubCommand.SNAPSHOTS:
-            options.append("snapshots")
-            options.extend(self.configuration.get_options())
-        elif self.settings.subcommand == SubCommand.BACKUP:
-            if forget:
-                options.append("forget")
-            elif prune:
-                options.append("prune")
-            else:
-                assert volume or localdir_name
-                options.append("backup")
-                if volume:
-                    options.append(f"/volume/{volume}")
-                else:
-                    options.append(f"/localdir/{localdir_name}")
-
-            options.extend(
-                self.configuration.get_options(volume, localdir_name, forget, prune)
-            )
-
-            if not prune:
-                options.extend(["--host", self.configuration.hostname])
-
-        elif self.settings.subcommand == SubCommand.RESTORE:
-            options.extend(["restore", self.settings.restore_snapshot])
-            options.extend(["--target", "/target"])
-            options.extend(self.configuration.get_options())
+        builder = self._RESTIC_ARGUMENTS_MUX.get(self.settings.subcommand)
+        if builder:
+            getattr(self, builder)(options, volume, localdir_name, forget, prune)
 
         if self.settings.restic_arguments:
             options.extend(self.settings.restic_arguments)
@@ -690,10 +931,70 @@ formatters:
 
         return options
 
+    def _restic_arguments_run(self, options: list, *_):
+        """Add the restic arguments for run"""
+        options.extend(self.configuration.get_options())
+
+    def _restic_arguments_exists(self, options: list, *_):
+        """Add the restic arguments for exists"""
+        # Only reads the repository, do not create a lock file in it
+        options.extend(["cat", "config", "--no-lock"])
+        options.extend(self.configuration.get_options())
+
+    def _restic_arguments_snapshots(self, options: list, *_):
+        """Add the restic arguments for snapshots"""
+        options.append("snapshots")
+        options.extend(self.configuration.get_options())
+
+    def _restic_arguments_backup(
+        self,
+        options: list,
+        volume: str,
+        localdir_name: str,
+        forget: bool,
+        prune: bool,
+    ):
+        """Add the restic arguments for backup, forget (eventually with
+        a prune) or prune"""
+        if forget:
+            options.append("forget")
+            if prune:
+                options.append("--prune")
+        elif prune:
+            options.append("prune")
+        else:
+            assert volume or localdir_name
+            options.append("backup")
+            if volume:
+                options.append(f"/volume/{volume}")
+            else:
+                options.append(f"/localdir/{localdir_name}")
+
+        options.extend(
+            self.configuration.get_options(volume, localdir_name, forget, prune)
+        )
+
+        if forget or not prune:
+            options.extend(["--host", self.configuration.hostname])
+
+    def _restic_arguments_restore(self, options: list, *_):
+        """Add the restic arguments for restore"""
+        options.extend(["restore", self.settings.restore_snapshot])
+        options.extend(["--target", "/target"])
+        options.extend(self.configuration.get_options())
+
     def _run_docker(
-        self, command: list, env: dict, volumes: dict, quiet=False, entrypoint=None
+        self,
+        command: list,
+        env: dict,
+        volumes: dict,
+        quiet=False,
+        entrypoint=None,
+        prefix: bytes = None,
+        collect=True,
     ) -> int:
-        """Execute docker with the configured options"""
+        """Execute docker with the configured options. The output is not
+        read at all if it is neither passed through (quiet) nor collected."""
 
         self.log(
             logging.debug,
@@ -703,34 +1004,225 @@ formatters:
             volumes,
         )
 
-        container = self.client.containers.run(
-            image=self.settings.image,
+        api = self.client.api
+        container = self._create_container(
             entrypoint=entrypoint,
             command=command,
             environment=env,
-            extra_hosts=(
-                {self._OWN_HOSTNAME: self.own_ip_address}
-                if self.own_ip_address and self.configuration.network_from is None
-                else None
-            ),
-            network_mode=(
-                "container:" + self.configuration.network_from
-                if self.configuration.network_from
-                else None
-            ),
-            volumes=volumes,
-            detach=True,
+            host_config=self._get_host_config(volumes),
         )
 
-        log_save = ""
-        for log in container.logs(stream=True):
-            line = log.decode("utf-8")
-            log_save += line
-            if not quiet:
-                print(line.rstrip())
+        try:
+            if quiet and not collect:
+                api.start(container)
+                log_save = ""
+            else:
+                # Attach before starting, so no output can get lost
+                sock = api.attach_socket(
+                    container, params={"stdout": 1, "stderr": 1, "stream": 1}
+                )
 
-        exit_code = container.wait()
+                try:
+                    api.start(container)
+                    log_save = self._read_output(sock, quiet, prefix).decode(
+                        "utf-8", errors="replace"
+                    )
+                finally:
+                    sock.close()
 
-        container.remove()
+            exit_code = api.wait(container)
+        finally:
+            api.remove_container(container, force=True)
 
         return (exit_code["StatusCode"], log_save)
+
+    def _get_host_config(self, volumes: dict | list) -> dict:
+        """Get the host configuration for a container with the given mounts,
+        either a dict as returned by _get_docker_mounts() or a list of
+        ``host:target:mode`` binds"""
+        # The same for all the containers of the run
+        if self._network_options is None:
+            self._network_options = {
+                "extra_hosts": (
+                    {self._OWN_HOSTNAME: self.own_ip_address}
+                    if self.own_ip_address and self.configuration.network_from is None
+                    else None
+                ),
+                "network_mode": (
+                    "container:" + self.configuration.network_from
+                    if self.configuration.network_from
+                    else None
+                ),
+            }
+
+        return self.client.api.create_host_config(
+            binds=volumes, **self._network_options
+        )
+
+    def _start_warm_container(self, env: dict, volumes: list) -> str:
+        """Start an idle container to execute restic commands in.
+
+        Returns
+        -------
+        str
+            The container ID, or None if the container could not be started
+            and the commands have to run in their own containers.
+        """
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        container = None
+
+        try:
+            self._restic_entrypoint = (
+                self.client.api.inspect_image(self.settings.image)["Config"][
+                    "Entrypoint"
+                ]
+                or self._DEFAULT_RESTIC_ENTRYPOINT
+            )
+
+            container = self._create_container(
+                entrypoint=self._WARM_ENTRYPOINT,
+                command=self._WARM_COMMAND,
+                environment=env,
+                host_config=self._get_host_config(volumes),
+            )
+            self.client.api.start(container)
+            self.log(logging.debug, "Started container %s", container)
+        except docker.errors.APIError as ex:
+            self.log(
+                logging.warning,
+                "Could not start a container for the backup, "
+                "using one per source: %s",
+                self.format_exception(ex),
+            )
+            if container:
+                self.client.api.remove_container(container, force=True)
+            container = None
+
+        return container
+
+    def _exec_restic(
+        self, container: str, command: list, quiet=False, prefix: bytes = None
+    ) -> tuple:
+        """Execute restic with the given arguments in a running container"""
+        self.log(logging.debug, "Executing restic command: %s", command)
+
+        api = self.client.api
+        exec_id = api.exec_create(
+            container, self._restic_entrypoint + command, stdout=True, stderr=True
+        )["Id"]
+
+        sock = api.exec_start(exec_id, socket=True)
+        try:
+            output = self._read_output(sock, quiet, prefix).decode(
+                "utf-8", errors="replace"
+            )
+        finally:
+            sock.close()
+
+        # The output can be closed a moment before the process is reaped
+        deadline = time.monotonic() + self._EXEC_EXIT_TIMEOUT
+        delay = 0.01
+        while (result := api.exec_inspect(exec_id))["Running"]:
+            if time.monotonic() >= deadline:
+                self.log(
+                    logging.error,
+                    "restic did not exit within %.0f s after closing its output",
+                    self._EXEC_EXIT_TIMEOUT,
+                )
+                return (1, output)
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        return (result["ExitCode"], output)
+
+    def _create_container(self, **kwargs) -> str:
+        """Create a container from the image, pulling it if not present"""
+        import docker.errors  # pylint: disable=import-outside-toplevel
+
+        try:
+            container = self.client.api.create_container(
+                image=self.settings.image, **kwargs
+            )
+        except docker.errors.ImageNotFound:
+            self._pull_image()
+            container = self.client.api.create_container(
+                image=self.settings.image, **kwargs
+            )
+
+        return container["Id"]
+
+    def _read_output(self, sock, quiet: bool, prefix: bytes = None) -> bytes:
+        """Read the multiplexed output of a container from an attached socket
+        until it is closed, passing it through unless quiet.
+
+        Each frame has an 8-byte header with the stream type and the big-endian
+        payload size, see the docker ``ContainerAttach`` API.
+
+        If a prefix is given, the output is passed through in whole lines,
+        each of them prefixed.
+        """
+        from docker.utils import socket as docker_socket  # pylint: disable=import-outside-toplevel
+
+        output = bytearray()
+        pending = bytearray()
+        line = bytearray()
+
+        if not quiet:
+            sys.stdout.flush()
+            last_flush = time.monotonic()
+
+        while True:
+            chunk = docker_socket.read(sock, self._READ_SIZE)
+            if chunk is None:  # Interrupted, try again
+                continue
+            if not chunk:
+                break
+
+            pending += chunk
+            offset = 0
+
+            with memoryview(pending) as view:
+                while len(pending) - offset >= self._FRAME_HEADER.size:
+                    _, size = self._FRAME_HEADER.unpack_from(view, offset)
+                    end = offset + self._FRAME_HEADER.size + size
+                    if end > len(pending):
+                        break
+
+                    with view[offset + self._FRAME_HEADER.size : end] as frame:
+                        output += frame
+                        if quiet:
+                            pass
+                        elif prefix is None:
+                            sys.stdout.buffer.write(frame)
+                        else:
+                            line += frame
+
+                    offset = end
+
+            del pending[:offset]
+
+            if line:
+                complete, separator, rest = line.rpartition(b"\n")
+                if separator:
+                    self._write_prefixed(prefix, complete + separator)
+                    line = bytearray(rest)
+
+            if not quiet and time.monotonic() - last_flush >= self._OUTPUT_FLUSH_INTERVAL:
+                sys.stdout.buffer.flush()
+                last_flush = time.monotonic()
+
+        if line:
+            self._write_prefixed(prefix, line + b"\n")
+
+        if not quiet:
+            sys.stdout.buffer.flush()
+
+        return bytes(output)
+
+    def _write_prefixed(self, prefix: bytes, lines: bytes):
+        """Write the newline-terminated lines to the standard output,
+        each prefixed"""
+        data = b"".join(prefix + line for line in lines.splitlines(keepends=True))
+        with self._output_lock:
+            sys.stdout.buffer.write(data)
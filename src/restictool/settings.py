@@ -31,8 +31,15 @@ class Settings:
     force_pull : bool
         If True the image will be pulled before running the backup. If False
         it will be only pulled if not present on the system.
+    pull_ttl : int
+        Number of seconds a forced pull is skipped for after the image
+        has been pulled. 0 disables skipping.
     configuration_stream : io.IOBase | str
-        The configuration file or string.
+        The configuration file or string. Takes precedence over
+        ``configuration_file``.
+    configuration_file : str
+        Path of the configuration file. It is only opened when loading
+        the configuration.
     cache_directory: str
         An absolute path to a cache directory.
     log_level : str
@@ -46,10 +53,15 @@ class Settings:
         Only read when restoring.
     restic_arguments : list
         Arguments passed to the ``restic``.
+    parallel : int
+        Maximum number of sources backed up at the same time.
+        Only read when backing up.
     """
 
     DEFAULT_IMAGE = "restic/restic"
     """Default image to pull/run"""
+    DEFAULT_PULL_TTL = 900
+    """Default number of seconds to skip a forced pull for (class attribute)."""
     DEFAULT_CONFIGURATION_FILE = path.join(
         environ["HOME"], ".config", "restictool", "restictool.yml"
     )
@@ -61,10 +73,13 @@ class Settings:
         self.subcommand = SubCommand.NOTSET
         self.image = self.DEFAULT_IMAGE
         self.force_pull = False
+        self.pull_ttl = self.DEFAULT_PULL_TTL
         self.configuration_stream = None
+        self.configuration_file = self.DEFAULT_CONFIGURATION_FILE
         self.cache_directory = self.DEFAULT_CACHE_DIR
         self.log_level = "WARNING"
         self.quiet = False
         self.restore_snapshot = None
         self.restore_directory = None
         self.restic_arguments = []
+        self.parallel = 1
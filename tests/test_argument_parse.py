@@ -42,11 +42,12 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
         """Test default arguments"""
         self.parser.parse(["run"])
         self.assertEqual(
-            self.parser.tool_arguments["config"].name, self.default_configuration_file
+            self.parser.tool_arguments["config"], self.default_configuration_file
         )
         self.assertEqual(self.parser.tool_arguments["cache"], self.default_cache_dir)
         self.assertEqual(self.parser.tool_arguments["image"], self.default_image)
         self.assertFalse(self.parser.tool_arguments["force_pull"])
+        self.assertEqual(self.parser.tool_arguments["pull_ttl"], 900)
         self.assertEqual(self.parser.tool_arguments["subcommand"], "run")
         self.assertEqual(len(self.parser.restic_arguments), 0)
 
@@ -70,7 +71,7 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
                 "run",
             ]
         )
-        self.assertEqual(self.parser.tool_arguments["config"].name, alt_config)
+        self.assertEqual(self.parser.tool_arguments["config"], alt_config)
         self.assertEqual(self.parser.tool_arguments["cache"], alt_cache)
         self.assertEqual(self.parser.tool_arguments["image"], alt_image)
         self.assertTrue(self.parser.tool_arguments["force_pull"])
@@ -87,7 +88,7 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
                 "run",
             ]
         )
-        self.assertEqual(self.parser.tool_arguments["config"].name, alt_config)
+        self.assertEqual(self.parser.tool_arguments["config"], alt_config)
         self.assertEqual(self.parser.tool_arguments["log_level"], "error")
         self.assertTrue(self.parser.tool_arguments["quiet"])
 
@@ -98,7 +99,7 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
                 "check",
             ]
         )
-        self.assertEqual(self.parser.tool_arguments["config"].name, alt_config)
+        self.assertEqual(self.parser.tool_arguments["config"], alt_config)
 
     def test_extra(self):
         """Test extra arguments"""
@@ -142,29 +143,53 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
         self.assertEqual(self.parser.tool_arguments["snapshot"], "oldone")
         self.assertEqual(self.parser.restic_arguments, ["-r", "bar"])
 
+    def test_repeated_parse(self):
+        """Test that parsing again does not keep the previous results"""
+        self.parser.parse(["-q", "restore", "-r", "foo", "--arg"])
+        self.parser.parse(["run"])
+        self.assertNotIn("restore", self.parser.tool_arguments)
+        self.assertFalse(self.parser.tool_arguments["quiet"])
+        self.assertEqual(self.parser.restic_arguments, [])
+
+        other = Arguments()
+        other.parse(["backup"])
+        self.assertEqual(other.tool_arguments["subcommand"], "backup")
+        self.assertEqual(self.parser.tool_arguments["subcommand"], "run")
+
     def test_exceptions(self):
         """Test invalid arguments"""
 
-        with pytest.raises(SystemExit):
-            self.parser.parse(["-c", "/tmp/nonexistent", "run"])
-
         with pytest.raises(SystemExit):
             self.parser.parse(["--image", "-v", "run"])
 
         with pytest.raises(SystemExit):
             self.parser.parse(["restore"])
 
+        with pytest.raises(SystemExit):
+            self.parser.parse(["backup", "--parallel", "0"])
+
+        with pytest.raises(SystemExit):
+            self.parser.parse(["backup", "--parallel", "many"])
+
+        with pytest.raises(SystemExit):
+            self.parser.parse(["--pull-ttl", "-1", "run"])
+
+    def test_config_not_opened(self):
+        """Test that the configuration file is not opened when parsing"""
+        self.parser.parse(["-c", "/tmp/nonexistent", "run"])
+        self.assertEqual(self.parser.tool_arguments["config"], "/tmp/nonexistent")
+
     def test_to_settings(self):
         """Test creating the settings class"""
         self.parser.parse(["run"])
         settings = self.parser.to_settings()
 
         self.assertEqual(settings.subcommand, SubCommand.RUN)
-        self.assertEqual(
-            settings.configuration_stream.name, self.default_configuration_file
-        )
+        self.assertEqual(settings.configuration_file, self.default_configuration_file)
+        self.assertIsNone(settings.configuration_stream)
         self.assertEqual(settings.image, Settings.DEFAULT_IMAGE)
         self.assertFalse(settings.force_pull)
+        self.assertEqual(settings.pull_ttl, Settings.DEFAULT_PULL_TTL)
         self.assertEqual(settings.cache_directory, Settings.DEFAULT_CACHE_DIR)
         self.assertEqual(settings.log_level, "WARNING")
         self.assertFalse(settings.quiet)
@@ -179,6 +204,8 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
                 "--image",
                 "my/restic",
                 "--force-pull",
+                "--pull-ttl",
+                "0",
                 "restore",
                 "-r",
                 "/tmp/restore",
@@ -189,6 +216,7 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
         self.assertEqual(settings.subcommand, SubCommand.RESTORE)
         self.assertEqual(settings.image, "my/restic")
         self.assertTrue(settings.force_pull)
+        self.assertEqual(settings.pull_ttl, 0)
         self.assertEqual(settings.cache_directory, "/tmp/cache")
         self.assertEqual(settings.log_level, "DEBUG")
         self.assertTrue(settings.quiet)
@@ -199,3 +227,9 @@ class TestArgumentParser(fake_filesystem_unittest.TestCase):
         settings = self.parser.to_settings()
 
         self.assertEqual(settings.subcommand, SubCommand.BACKUP)
+        self.assertEqual(settings.parallel, 1)
+
+        self.parser.parse(["backup", "--parallel", "3"])
+        settings = self.parser.to_settings()
+
+        self.assertEqual(settings.parallel, 3)
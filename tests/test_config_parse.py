@@ -2,6 +2,7 @@
 
 import io
 import os
+import tempfile
 import unittest
 import platform
 import pytest
@@ -69,6 +70,28 @@ localdirs:
         self.assertFalse(config_stream.closed)
         config_stream.close()
 
+    def test_load_bytes(self):
+        """Test load from a binary stream and from a buffer"""
+        config_stream = io.BytesIO(self.config_yaml.encode("utf-8"))
+
+        self.config.load(config_stream)
+        self.assertTrue(config_stream.closed)
+        self.assertEqual(self.config.hostname, "myhost")
+
+        self.config.load(self.config_yaml.encode("utf-8"))
+        self.assertEqual(self.config.hostname, "myhost")
+
+    def test_load_repeated(self):
+        """Test that loading the same text again gives a fresh configuration"""
+        self.config.load(self.config_yaml)
+        self.config.configuration["repository"]["host"] = "changed"
+        self.config.configuration["localdirs"].clear()
+
+        other = Configuration()
+        other.load(self.config_yaml)
+        self.assertEqual(other.configuration["repository"]["host"], "myhost")
+        self.assertEqual(len(other.configuration["localdirs"]), 1)
+
     def test_validate(self):
         """Test the validator"""
         self.config.load(
@@ -87,6 +110,42 @@ repository:
         with pytest.raises(ValueError, match="location"):
             self.config.load("repository:\n  location:\n")
 
+    def test_peek_repository(self):
+        """Test reading the repository section only"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_file = os.path.join(tmp_dir, "restictool.yml")
+
+            with open(config_file, "w", encoding="utf-8") as file:
+                file.write(self.config_yaml)
+
+            repository = Configuration.peek_repository(config_file)
+            self.assertEqual(repository["host"], "myhost")
+
+            # Section at the start of a file longer than the peeked prefix
+            with open(config_file, "w", encoding="utf-8") as file:
+                file.write(self.config_yaml)
+                file.write("volumes:\n")
+                for i in range(Configuration._PEEK_SIZE // 10):
+                    file.write(f"  - name: v{i}\n")
+
+            repository = Configuration.peek_repository(config_file)
+            self.assertEqual(repository["host"], "myhost")
+
+            # Section at the end of a file longer than the peeked prefix
+            with open(config_file, "w", encoding="utf-8") as file:
+                file.write("# " + "x" * Configuration._PEEK_SIZE + "\n")
+                file.write(self.config_yaml)
+
+            repository = Configuration.peek_repository(config_file)
+            self.assertEqual(repository["host"], "myhost")
+            self.assertEqual(repository["password"], "MySecretPassword")
+
+            with open(config_file, "w", encoding="utf-8") as file:
+                file.write("options:\n  common:\n    - --insecure-tls\n")
+
+            with pytest.raises(ValueError, match="repository"):
+                Configuration.peek_repository(config_file)
+
     def test_env_vars(self):
         """Test environment variables parsing"""
         self.config.load(self.config_yaml)
@@ -137,6 +196,13 @@ repository:
         self.config.load(self.config_yaml)
         self.assertEqual(self.config.get_options(), ["--insecure-tls"])
 
+    def test_options_returned_copy(self):
+        """Test that modifying the returned options does not affect later calls"""
+        self.config.load(self.config_yaml)
+        options = self.config.get_options(volume="my_volume")
+        options.append("--modified")
+        self.assertNotIn("--modified", self.config.get_options(volume="my_volume"))
+
     def test_options_forget(self):
         """Test parsing of the forget options"""
         self.config.load(self.config_yaml)
@@ -398,6 +464,49 @@ volumes:
             )
         )
 
+        self.config.load(
+            """
+repository:
+  location: "s3:https://somewhere:8010/restic-backups"
+  password: "MySecretPassword"
+volumes:
+    - name: '*'
+"""
+        )
+        self.assertEqual(self.config.volumes_to_exclude, [])
+        self.assertTrue(self.config.is_volume_backed_up("vol2"))
+
+    def test_filter_volumes(self):
+        anonymous = "0123456789abcdef0123456789abcdef0123456789abcdef"
+        names = ["volx", "vol3", anonymous, "vol2", "vol2"]
+
+        self.config.load(
+            """
+repository:
+  location: "s3:https://somewhere:8010/restic-backups"
+  password: "MySecretPassword"
+volumes:
+    - name: vol3
+    - name: vol2
+"""
+        )
+        self.assertEqual(self.config.filter_volumes_to_backup(names), ["vol2", "vol3"])
+
+        self.config.load(
+            """
+repository:
+  location: "s3:https://somewhere:8010/restic-backups"
+  password: "MySecretPassword"
+volumes:
+    - name: '*'
+      exclude:
+        - vol3
+"""
+        )
+        self.assertEqual(
+            self.config.filter_volumes_to_backup(iter(names)), ["vol2", "volx"]
+        )
+
     def test_volume_exclude_wildcard_only(self):
         self.config.load(
             """
@@ -5,7 +5,12 @@ import pytest
 import yaml
 
 from schema import SchemaError
-from restictool.configuration_validator import validate
+from restictool.configuration_validator import (
+    validate,
+    SCHEMA,
+    NON_EMPTY_STR,
+    NON_EMPTY_OPTION,
+)
 
 
 class TestConfigValidator(unittest.TestCase):
@@ -136,6 +141,20 @@ localdirs:
             '--exclude="/localdir/my_tag/some_dir"',
         )
 
+    def test_non_empty_predicates(self):
+        """Validate the shared non-empty string predicates"""
+        self.assertEqual(NON_EMPTY_STR.validate("x"), "x")
+        self.assertEqual(NON_EMPTY_OPTION.validate(7), "7")
+
+        with pytest.raises(SchemaError):
+            NON_EMPTY_STR.validate("")
+
+        with pytest.raises(SchemaError):
+            NON_EMPTY_STR.validate(7)
+
+        with pytest.raises(SchemaError):
+            NON_EMPTY_OPTION.validate("")
+
     def test_validate_repository(self):
         """Validate repository part more thoroughly"""
         validate(
@@ -502,3 +521,90 @@ metrics:
 """
                 )
             )
+
+    def test_validate_matches_schema(self):
+        """The validator accepts and rejects the same as the documented schema"""
+        valid = yaml.safe_load(
+            """
+repository:
+  location: "s3:https://somewhere:8010/restic-backups"
+  password: "MySecretPassword"
+  host: myhost
+  authentication:
+    AWS_ACCESS_KEY_ID: "S3:SomeKeyId"
+logging:
+  version: 1
+metrics:
+  directory: "/foo"
+options:
+  common:
+    - --insecure-tls
+  forget:
+    - --keep-daily
+    - 7
+  prune:
+volumes:
+  - name: my_volume
+    options:
+      - --exclude-caches
+  - name: '*'
+    exclude:
+      - this_one
+localdirs:
+  - name: my_tag
+    path: path
+"""
+        )
+        self.assertEqual(validate(valid), SCHEMA.validate(valid))
+
+        for invalid in [
+            None,
+            [],
+            {"repository": {"location": "foo", "password": "bar", "extra": {"A": 1}}},
+            {"repository": {"location": "foo", "password": "bar", "extra": {}}},
+            {
+                "repository": {
+                    "location": "foo",
+                    "password": "bar",
+                    "authentication": {},
+                }
+            },
+            {"repository": {"location": "foo", "password": "bar"}, "logging": []},
+            {"repository": {"location": "foo", "password": "bar"}, "volumes": {}},
+        ]:
+            with pytest.raises(SchemaError):
+                SCHEMA.validate(invalid)
+            with pytest.raises(SchemaError):
+                validate(invalid)
+
+    def test_validate_copies(self):
+        """The validated configuration does not share containers with the input"""
+        config = yaml.safe_load(
+            """
+repository:
+  location: "s3:https://somewhere:8010/restic-backups"
+  password: "MySecretPassword"
+  authentication:
+    AWS_ACCESS_KEY_ID: "S3:SomeKeyId"
+logging:
+  version: 1
+  root:
+    level: INFO
+options:
+  forget:
+    - --keep-daily
+    - 7
+"""
+        )
+        validated = validate(config)
+
+        self.assertEqual(validated["options"]["forget"][1], "7")
+        self.assertEqual(config["options"]["forget"][1], 7)
+
+        validated["repository"]["authentication"].clear()
+        validated["logging"]["root"]["level"] = "DEBUG"
+        validated["options"]["forget"].clear()
+
+        self.assertEqual(validate(config), validate(yaml.safe_load(yaml.dump(config))))
+        self.assertEqual(config["logging"]["root"]["level"], "INFO")
+        self.assertEqual(len(config["repository"]["authentication"]), 1)
@@ -4,6 +4,7 @@ import io
 import unittest
 import json
 import os
+from dateutil import parser
 from pyfakefs import fake_filesystem_unittest
 
 from restictool.configuration_parser import Configuration
@@ -87,6 +88,31 @@ metrics:
         self.assertAlmostEqual(
             Metrics.time_string_to_time_stamp("2024-12-10T19:43:56Z"), 1733859836.0
         )
+        self.assertEqual(
+            Metrics.time_string_to_time_stamp("2024-12-10T20:43:56.5+01:00"),
+            1733859836.5,
+        )
+        self.assertEqual(
+            Metrics.time_string_to_time_stamp("2024-12-10T19:43:56.123456789Z"),
+            parser.isoparse("2024-12-10T19:43:56.123456789Z").timestamp(),
+        )
+        self.assertEqual(
+            Metrics.time_string_to_time_stamp("20241210T194356Z"), 1733859836.0
+        )
+        for invalid in [
+            "2024-13-10T19:43:56Z",
+            "2024-02-30T19:43:56Z",
+            "2024-12-10T19:43:61Z",
+            "2024-12-10T19:60:56Z",
+            "2024-12-10T19:43:56+25:00",
+            "2024-12-10T19:43:56+01:60",
+        ]:
+            with self.assertRaises(ValueError):
+                Metrics.time_string_to_time_stamp(invalid)
+        self.assertEqual(
+            Metrics.time_string_to_time_stamp("2024-12-10T24:00:00Z"),
+            parser.isoparse("2024-12-10T24:00:00Z").timestamp(),
+        )
 
     def test_file_write(self):
         self.assertTrue(self.config.metrics_dir_exists())
@@ -1,12 +1,21 @@
 """Test docker interacing to restic"""
 
+import io
+import logging
 import os
 import shutil
+import socket
+import struct
+import sys
+import threading
+import time
+from unittest import mock
+import docker
 from pyfakefs import fake_filesystem_unittest
 
 from restictool.argument_parser import Arguments
-from restictool.restic_tool import ResticTool
-from restictool.settings import Settings
+from restictool.restic_tool import ResticTool, ResticToolException
+from restictool.settings import Settings, SubCommand
 
 # pylint: disable=protected-access
 
@@ -80,12 +89,176 @@ localdirs:
         tool.setup()
         return tool
 
+    def test_missing_configuration(self):
+        """Test that a missing configuration file is reported by the setup"""
+        with self.assertRaises(ResticToolException) as ctx:
+            self.prepare_tool(["-c", "/tmp/nonexistent", "run"])
+        self.assertEqual(ctx.exception.exit_code, 16)
+
+    def test_unknown_command(self):
+        """Test that only the known sub-commands are accepted"""
+        settings = Settings()
+        with self.assertRaises(ResticToolException) as ctx:
+            ResticTool(settings).setup()
+        self.assertEqual(ctx.exception.exit_code, 16)
+
+        settings.subcommand = SubCommand.CHECK
+        tool = ResticTool(settings)
+        tool.setup()
+        self.assertIsNone(tool.client)
+
+    def test_log_disabled_level(self):
+        """Test that a message below the level is dropped early"""
+        tool = self.prepare_tool(["run"])
+        root = logging.getLogger()
+        level = root.level
+        root.setLevel(logging.WARNING)
+        try:
+            with mock.patch.object(logging.Logger, "_log") as log:
+                tool.log(logging.debug, "not logged %s", "x")
+                log.assert_not_called()
+                tool.log(logging.warning, "logged %s", "y", entity="vol")
+                log.assert_called_once()
+                self.assertEqual(log.call_args.kwargs["extra"]["object"], "vol")
+        finally:
+            root.setLevel(level)
+
     def test_own_host(self):
         """Test docker network address determination"""
         tool = self.prepare_tool(["run"])
         tool._find_own_network()
         self.assertEqual(tool.own_ip_address, self.OWN_IP_ADDRESS)
 
+    def test_own_host_network_from(self):
+        """Test that the network is not looked up if it is not used"""
+        with open(self.default_configuration_file, "w", encoding="utf8") as file:
+            file.write(self.config_yaml.replace("  host: myhost", "  network_from: vpn"))
+        tool = self.prepare_tool(["run"])
+        tool.client = mock.MagicMock()
+        tool._find_own_network()
+        tool.client.api.inspect_network.assert_not_called()
+        self.assertIsNone(tool.own_ip_address)
+
+    def test_host_config(self):
+        """Test that the network options are computed once per setup"""
+        tool = self.prepare_tool(["run"])
+        tool.client = mock.MagicMock()
+        tool.own_ip_address = self.OWN_IP_ADDRESS
+        tool._get_host_config({})
+        tool._get_host_config({"/a": {"bind": "/b", "mode": "rw"}})
+
+        first, second = tool.client.api.create_host_config.call_args_list
+        self.assertEqual(
+            first.kwargs["extra_hosts"], {"restictool.local": self.OWN_IP_ADDRESS}
+        )
+        self.assertIs(first.kwargs["extra_hosts"], second.kwargs["extra_hosts"])
+        self.assertIsNone(second.kwargs["network_mode"])
+        self.assertEqual(second.kwargs["binds"], {"/a": {"bind": "/b", "mode": "rw"}})
+
+        with open(self.default_configuration_file, "w", encoding="utf8") as file:
+            file.write(
+                self.config_yaml.replace("  host: myhost", "  network_from: vpn")
+            )
+        tool.setup()
+        tool.client = mock.MagicMock()
+        tool._get_host_config({})
+        self.assertEqual(
+            tool.client.api.create_host_config.call_args.kwargs["network_mode"],
+            "container:vpn",
+        )
+
+    def test_pull_if_needed(self):
+        """Test pulling the image only if missing or forced"""
+        tool = self.prepare_tool(["run"])
+        tool.client = mock.MagicMock()
+        tool._pull_if_needed()
+        tool.client.api.inspect_image.assert_called_once_with("restic/restic")
+        tool.client.api.pull.assert_not_called()
+
+        tool.client.api.inspect_image.side_effect = docker.errors.ImageNotFound("x")
+        tool._pull_if_needed()
+        tool.client.api.pull.assert_called_once()
+
+        tool = self.prepare_tool(
+            ["--force-pull", "--pull-ttl", "0", "--image", "my/restic:1.0", "run"]
+        )
+        tool.client = mock.MagicMock()
+        tool._pull_if_needed()
+        tool.client.api.inspect_distribution.assert_called_once_with("my/restic:1.0")
+        tool.client.api.pull.assert_called_once_with(
+            "my/restic:1.0", stream=True, decode=True
+        )
+
+        tool.client.api.pull.return_value = [{"status": "x"}, {"error": "denied"}]
+        with self.assertRaises(docker.errors.APIError):
+            tool._pull_if_needed()
+
+    def test_pull_if_changed(self):
+        """Test skipping a forced pull of an image that is up to date"""
+        tool = self.prepare_tool(["--force-pull", "--pull-ttl", "0", "run"])
+        tool.client = mock.MagicMock()
+        api = tool.client.api
+        api.inspect_image.return_value = {
+            "RepoDigests": ["restic/restic@sha256:1234"]
+        }
+        api.inspect_distribution.return_value = {
+            "Descriptor": {"digest": "sha256:1234"}
+        }
+        tool._pull_if_needed()
+        api.inspect_distribution.assert_called_once_with("restic/restic")
+        api.pull.assert_not_called()
+
+        api.inspect_distribution.return_value = {
+            "Descriptor": {"digest": "sha256:5678"}
+        }
+        tool._pull_if_needed()
+        api.pull.assert_called_once()
+
+        api.inspect_distribution.side_effect = docker.errors.APIError("offline")
+        tool._pull_if_needed()
+        self.assertEqual(api.pull.call_count, 2)
+
+    def test_pull_ttl(self):
+        """Test skipping a forced pull of a recently pulled image"""
+        tool = self.prepare_tool(["--force-pull", "run"])
+        tool._create_directories()
+        tool.client = mock.MagicMock()
+        tool.client.api.inspect_image.return_value = {
+            "RepoDigests": ["restic/restic@sha256:1234"]
+        }
+        tool.client.api.inspect_distribution.return_value = {
+            "Descriptor": {"digest": "sha256:new"}
+        }
+
+        tool._pull_if_needed()
+        tool.client.api.pull.assert_called_once()
+        pulls_file = os.path.join(self.default_cache_dir, ".restictool_pulls.json")
+        self.assertEqual(os.stat(pulls_file).st_mode & 0o777, 0o600)
+
+        tool._pull_if_needed()
+        tool.client.api.pull.assert_called_once()
+
+        # A different image locally
+        tool.client.api.inspect_image.return_value = {
+            "RepoDigests": ["restic/restic@sha256:5678"]
+        }
+        tool._pull_if_needed()
+        self.assertEqual(tool.client.api.pull.call_count, 2)
+
+        with mock.patch("time.time", return_value=time.time() + 900):
+            tool._pull_if_needed()
+        self.assertEqual(tool.client.api.pull.call_count, 3)
+
+        with open(pulls_file, "w", encoding="utf-8") as file:
+            file.write("garbage")
+        tool._pull_if_needed()
+        self.assertEqual(tool.client.api.pull.call_count, 4)
+        tool._pull_if_needed()
+        self.assertEqual(tool.client.api.pull.call_count, 4)
+        self.assertEqual(
+            os.listdir(self.default_cache_dir), [".restictool_pulls.json"]
+        )
+
     def test_create_cache_directory(self):
         """Test creation of cache directory"""
         if os.path.exists(self.default_cache_base):
@@ -105,6 +278,15 @@ localdirs:
         tool._create_directories()
         self.assertTrue(os.path.exists(restore_dir))
 
+    def test_create_directory_over_file(self):
+        """Test that an existing file is not accepted as a directory"""
+        os.makedirs(self.default_cache_base, exist_ok=True)
+        with open(self.default_cache_dir, "w", encoding="utf8") as file:
+            file.write("not a directory")
+        tool = self.prepare_tool(["run"])
+        with self.assertRaises(ResticToolException):
+            tool._create_directories()
+
     def test_run_mount(self):
         """Test docker mounts for run"""
         tool = self.prepare_tool(["run"])
@@ -113,6 +295,12 @@ localdirs:
             mounts, {self.default_cache_dir: {"bind": "/cache", "mode": "rw"}}
         )
 
+        mounts["/somewhere"] = {"bind": "/target", "mode": "rw"}
+        self.assertEqual(
+            tool._get_docker_mounts(),
+            {self.default_cache_dir: {"bind": "/cache", "mode": "rw"}},
+        )
+
     def test_backup_mount_volume(self):
         """Test docker mounts for volume backup"""
         tool = self.prepare_tool(["backup"])
@@ -210,6 +398,28 @@ localdirs:
             ],
         )
 
+    def test_backup_options_forget_prune(self):
+        """Test docker options for forget with prune"""
+        tool = self.prepare_tool(["backup", "--my-arg1"])
+        options = tool._get_restic_arguments(forget=True, prune=True)
+        self.assertEqual(
+            options,
+            [
+                "--cache-dir",
+                "/cache",
+                "forget",
+                "--prune",
+                "--insecure-tls",
+                "--keep-daily",
+                "7",
+                "--max-unused",
+                "200M",
+                "--host",
+                "myhost",
+                "--my-arg1",
+            ],
+        )
+
     def test_backup_options_prune(self):
         """Test docker options for prune"""
         tool = self.prepare_tool(["backup", "--my-arg1", "--my-arg2"])
@@ -228,6 +438,15 @@ localdirs:
             ],
         )
 
+    def test_exists_options(self):
+        """Test docker options for exists"""
+        tool = self.prepare_tool(["exists"])
+        options = tool._get_restic_arguments()
+        self.assertEqual(
+            options,
+            ["--cache-dir", "/cache", "cat", "config", "--no-lock", "--insecure-tls"],
+        )
+
     def test_restore_options(self):
         """Test docker options for restore"""
         tool = self.prepare_tool(
@@ -264,3 +483,272 @@ localdirs:
                 "myhost",
             ],
         )
+
+    def test_run_docker_output(self):
+        """Test passing through and collecting the container output"""
+        tool = self.prepare_tool(["run"])
+        tool.client = mock.MagicMock()
+        api = tool.client.api
+        api.create_container.return_value = {"Id": "abcd"}
+        api.wait.return_value = {"StatusCode": 3}
+
+        def attach(frames):
+            ours, theirs = socket.socketpair()
+
+            def send():
+                for stream, payload in frames:
+                    header = struct.pack(">BxxxI", stream, len(payload))
+                    theirs.sendall(header + payload)
+                theirs.close()
+
+            threading.Thread(target=send).start()
+            tool.client.api.attach_socket.return_value = ours
+
+        attach([(1, b"line 1\n"), (2, b"err\n"), (1, b"x" * 70000 + b"\n")])
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with mock.patch.object(sys, "stdout", stdout):
+            code, output = tool._run_docker(["snapshots"], env={}, volumes={})
+
+        expected = "line 1\nerr\n" + "x" * 70000 + "\n"
+        self.assertEqual(code, 3)
+        self.assertEqual(output, expected)
+        self.assertEqual(stdout.buffer.getvalue(), expected.encode("utf-8"))
+        api.start.assert_called_once_with("abcd")
+        api.remove_container.assert_called_once_with("abcd", force=True)
+        self.assertEqual(
+            api.create_host_config.call_args.kwargs["extra_hosts"],
+            {"restictool.local": tool.own_ip_address} if tool.own_ip_address else None,
+        )
+
+        attach([(1, b"quiet\n")])
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with mock.patch.object(sys, "stdout", stdout):
+            code, output = tool._run_docker(
+                ["snapshots"], env={}, volumes={}, quiet=True
+            )
+
+        self.assertEqual(output, "quiet\n")
+        self.assertEqual(stdout.buffer.getvalue(), b"")
+
+        api.attach_socket.reset_mock()
+        code, output = tool._run_docker(
+            ["cat", "config"], env={}, volumes={}, quiet=True, collect=False
+        )
+        self.assertEqual((code, output), (3, ""))
+        api.attach_socket.assert_not_called()
+
+        attach([(1, b"one\ntw"), (1, b"o\n"), (2, b"three")])
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with mock.patch.object(sys, "stdout", stdout):
+            code, output = tool._run_docker(
+                ["snapshots"], env={}, volumes={}, prefix=b"[vol] "
+            )
+
+        self.assertEqual(output, "one\ntwo\nthree")
+        self.assertEqual(
+            stdout.buffer.getvalue(), b"[vol] one\n[vol] two\n[vol] three\n"
+        )
+
+    def test_run_docker_pull_and_cleanup(self):
+        """Test pulling a missing image and removing the container on errors"""
+        tool = self.prepare_tool(["run"])
+        tool.client = mock.MagicMock()
+        api = tool.client.api
+        api.create_container.side_effect = [
+            docker.errors.ImageNotFound("missing"),
+            {"Id": "abcd"},
+        ]
+        api.attach_socket.side_effect = OSError("broken")
+
+        with self.assertRaises(OSError):
+            tool._run_docker(["snapshots"], env={}, volumes={})
+
+        tool.client.api.pull.assert_called_once_with(
+            "restic/restic", stream=True, decode=True
+        )
+        api.remove_container.assert_called_once_with("abcd", force=True)
+
+    def test_volumes_to_backup(self):
+        """Test selecting the volumes to back up"""
+        tool = self.prepare_tool(["backup"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {
+            "Volumes": [
+                {"Name": name} for name in ["my_volume_2", "my_volume", "other"]
+            ]
+        }
+
+        self.assertEqual(tool._get_volumes_to_backup(), ["my_volume"])
+        tool.client.api.volumes.assert_called_once_with(
+            filters={"name": ["my_volume"]}
+        )
+
+        tool.client.api.volumes.return_value = {"Volumes": None}
+        self.assertEqual(tool._get_volumes_to_backup(), [])
+
+    def test_backup_parallel(self):
+        """Test that all the sources are backed up when running in parallel"""
+        tool = self.prepare_tool(["backup", "--parallel", "2"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {"Volumes": [{"Name": "my_volume"}]}
+
+        with mock.patch.object(
+            tool, "_start_warm_container", return_value=None
+        ), mock.patch.object(tool, "_run_docker", return_value=(0, "[]")) as run:
+            tool._run_backup()
+
+        backed_up = {call.kwargs["command"][3] for call in run.call_args_list[:3]}
+        self.assertEqual(
+            backed_up,
+            {"/volume/my_volume", "/localdir/my_tag", "/localdir/my_home"},
+        )
+
+    def test_backup_parallel_concurrent(self):
+        """Test that the sources are backed up concurrently, with whole
+        prefixed output lines"""
+        tool = self.prepare_tool(["backup", "--parallel", "2"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {"Volumes": []}
+
+        # Both backups have to be running at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run_docker(command, prefix=None, **_):
+            if "backup" in command:
+                barrier.wait()
+                for i in range(200):
+                    tool._write_prefixed(prefix, f"line {i}\n".encode())
+            return 0, b""
+
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with mock.patch.object(
+            tool, "_start_warm_container", return_value=None
+        ), mock.patch.object(
+            tool, "_run_docker", side_effect=run_docker
+        ), mock.patch.object(sys, "stdout", stdout):
+            tool._run_backup()
+
+        self.assertFalse(barrier.broken)
+        lines = stdout.buffer.getvalue().decode().splitlines()
+        expected = [
+            f"[{name}] line {i}" for name in ("my_tag", "my_home") for i in range(200)
+        ]
+        self.assertEqual(sorted(lines), sorted(expected))
+
+    def test_backup_warm_container(self):
+        """Test that the sources are backed up in one running container"""
+        tool = self.prepare_tool(["backup"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {"Volumes": [{"Name": "my_volume"}]}
+        api = tool.client.api
+        api.inspect_image.return_value = {"Config": {"Entrypoint": ["/usr/bin/restic"]}}
+        api.create_container.return_value = {"Id": "warm"}
+        api.exec_create.return_value = {"Id": "exec"}
+        api.exec_inspect.return_value = {"Running": False, "ExitCode": 0}
+
+        with mock.patch.object(
+            tool, "_read_output", return_value=b""
+        ), mock.patch.object(
+            tool, "_run_docker", return_value=(0, "[]")
+        ) as run, self.assertLogs(level=logging.INFO) as logs:
+            tool._run_backup()
+
+        api.create_container.assert_called_once()
+        binds = api.create_host_config.call_args.kwargs["binds"]
+        self.assertEqual(
+            binds,
+            [
+                self.default_cache_dir + ":/cache:rw",
+                "my_volume:/volume/my_volume:rw",
+                "/path:/localdir/my_tag:rw",
+                os.environ["HOME"] + ":/localdir/my_home:rw",
+            ],
+        )
+
+        commands = [call.args[1] for call in api.exec_create.call_args_list]
+        self.assertEqual(len(commands), 3)
+        self.assertTrue(all(cmd[0] == "/usr/bin/restic" for cmd in commands))
+        self.assertEqual(
+            {cmd[4] for cmd in commands},
+            {"/volume/my_volume", "/localdir/my_tag", "/localdir/my_home"},
+        )
+        api.remove_container.assert_called_once_with("warm", force=True)
+
+        # forget and prune still run in their own container, in a single run
+        commands = [call.kwargs["command"][2:4] for call in run.call_args_list]
+        self.assertEqual(commands, [["forget", "--prune"]])
+        self.assertIn(
+            "Successfully run forget policy and pruned the snapshots",
+            logs.output[-1],
+        )
+
+    def test_backup_warm_container_shared_path(self):
+        """Test that local directories sharing a path are all mounted"""
+        with open(self.default_configuration_file, "w", encoding="utf8") as file:
+            file.write(
+                self.config_yaml.replace("path: '~'", "path: /path").replace(
+                    "volumes:\n  - name: my_volume", "volumes:\n  - name: none"
+                )
+            )
+        tool = self.prepare_tool(["backup"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {"Volumes": []}
+        api = tool.client.api
+        api.inspect_image.return_value = {"Config": {"Entrypoint": None}}
+        api.create_container.return_value = {"Id": "warm"}
+        api.exec_create.return_value = {"Id": "exec"}
+        api.exec_inspect.return_value = {"Running": False, "ExitCode": 0}
+
+        with mock.patch.object(
+            tool, "_read_output", return_value=b""
+        ), mock.patch.object(tool, "_run_docker", return_value=(0, "[]")):
+            tool._run_backup()
+
+        self.assertEqual(
+            api.create_host_config.call_args.kwargs["binds"],
+            [
+                self.default_cache_dir + ":/cache:rw",
+                "/path:/localdir/my_tag:rw",
+                "/path:/localdir/my_home:rw",
+            ],
+        )
+        self.assertEqual(
+            {call.args[1][4] for call in api.exec_create.call_args_list},
+            {"/localdir/my_tag", "/localdir/my_home"},
+        )
+
+    def test_backup_warm_container_fallback(self):
+        """Test that a container per source is used if the warm one fails"""
+        tool = self.prepare_tool(["backup"])
+        tool.client = mock.MagicMock()
+        tool.client.api.volumes.return_value = {"Volumes": [{"Name": "my_volume"}]}
+        api = tool.client.api
+        api.inspect_image.return_value = {"Config": {"Entrypoint": None}}
+        api.create_container.return_value = {"Id": "warm"}
+        api.start.side_effect = docker.errors.APIError("cannot start")
+
+        with mock.patch.object(tool, "_run_docker", return_value=(0, "[]")) as run:
+            tool._run_backup()
+
+        api.remove_container.assert_called_once_with("warm", force=True)
+        api.exec_create.assert_not_called()
+
+        commands = [call.kwargs["command"] for call in run.call_args_list]
+        self.assertEqual(
+            {cmd[3] for cmd in commands if cmd[2] == "backup"},
+            {"/volume/my_volume", "/localdir/my_tag", "/localdir/my_home"},
+        )
+        self.assertEqual(len(commands), 4)
+
+    def test_exec_restic_stuck(self):
+        """Test that an exec that does not exit is given up on"""
+        tool = self.prepare_tool(["backup"])
+        tool.client = mock.MagicMock()
+        tool._restic_entrypoint = ["restic"]
+        tool._EXEC_EXIT_TIMEOUT = 0.05
+        api = tool.client.api
+        api.exec_create.return_value = {"Id": "exec"}
+        api.exec_inspect.return_value = {"Running": True, "ExitCode": None}
+
+        with mock.patch.object(tool, "_read_output", return_value=b"out"):
+            self.assertEqual(tool._exec_restic("warm", ["version"]), (1, "out"))